@@ -1,9 +1,22 @@
 import os
-import json
+import hashlib
+import logging
+import asyncio
+import httpx
+import orjson
 import requests
 import time
 from datetime import datetime
-from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# basicConfig is a no-op if the runtime already installed a root handler,
+# so set the level explicitly as well
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger()
+log.setLevel(logging.INFO)
+# httpx logs every request at INFO; keep that off the hot path
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # ===========================
 # CONFIGURATION
@@ -24,36 +37,109 @@ JIRA_CLOUD_ID = os.getenv("JIRA_CLOUD_ID")
 # ✅ TARGETED PROJECT KEYS
 SERVICE_DESK_KEYS = ["MOBILE", "ERT", "SNDBX"]
 
+# Salesforce OAuth token, reused across warm invocations until near expiry
+_SF_TOKEN = {"access_token": None, "instance_url": None, "expires_at": 0}
+
+# Max account Ids per SOQL "IN (...)" clause
+SF_ID_CHUNK_SIZE = 200
+
+# Optional Contact formula fields (indexed boolean + derived role label), e.g.
+#   Is_Authorized__c    = CONTAINS(Position__c, 'Authorized') || INCLUDES(Contact_Role__c, ...)
+#   Authorized_Role__c  = 'Authorized Signatory' / 'Authorized Representative'
+# When both are set, contacts are filtered on the boolean instead of LIKE '%...%' scans.
+SF_AUTH_CONTACT_FIELD = os.getenv("SF_AUTH_CONTACT_FIELD")
+SF_AUTH_ROLE_FIELD = os.getenv("SF_AUTH_ROLE_FIELD")
+USE_AUTH_FORMULA = bool(SF_AUTH_CONTACT_FIELD and SF_AUTH_ROLE_FIELD)
+
+# Max accounts synced to Jira at the same time, and max customers being created/updated
+# across all of them (keeps us under JSM rate limits)
+JIRA_CONCURRENCY = int(os.getenv("JIRA_CONCURRENCY", "8"))
+
+# Accounts fetched from Salesforce but not yet picked up by a Jira worker
+ACCOUNT_QUEUE_SIZE = 16
+
+# Extra pause (seconds) a worker takes when Jira reports X-RateLimit-NearLimit
+NEAR_LIMIT_PAUSE = 1.0
+
+# Times a Jira request is re-sent after a 429 before giving up
+RATE_LIMIT_RETRIES = 3
+
+# Jira socket cap. Over HTTP/2 each origin (JIRA_URL, api.atlassian.com) multiplexes
+# all streams on one connection; the headroom only matters on an HTTP/1.1 fallback.
+JIRA_MAX_CONNECTIONS = int(os.getenv("JIRA_MAX_CONNECTIONS", "4"))
+
+# Org detail field holding a digest of the last successfully synced content, used to
+# skip unchanged accounts. The field must already exist in the CSM organization
+# details configuration (a text field, e.g. "Sync Hash"); otherwise every account
+# would pay a failed read plus the 404 write retries. Unset disables the skip.
+SYNC_HASH_FIELD = os.getenv("SYNC_HASH_FIELD")
+
+# JSM org name (see _org_key) -> org id, primed once per run
+_ORG_CACHE: dict[str, str] = {}
+
+# Customer email (lowercased) -> Jira accountId; survives warm invocations
+_USER_CACHE: dict[str, str] = {}
+
 
 # Shared JIRA Auth
-AUTH = HTTPBasicAuth(EMAIL, API_TOKEN)
+AUTH = (EMAIL, API_TOKEN)
 JIRA_HEADERS = {
     "Accept": "application/json",
     "Content-Type": "application/json",
 }
 
+# Shared Salesforce session: keeps TLS connections alive between calls
+# (Jira traffic goes through the shared httpx.AsyncClient instead)
+SF_SESSION = requests.Session()
+SF_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504]),
+))
+
 # ===========================
 # SALESFORCE HELPERS
 # ===========================
 def get_salesforce_token():
+    if _SF_TOKEN["access_token"] and time.time() < _SF_TOKEN["expires_at"] - 60:
+        return _SF_TOKEN["access_token"], _SF_TOKEN["instance_url"]
+
     data = {
         "grant_type": "client_credentials",
         "client_id": SF_CLIENT_ID,
         "client_secret": SF_CLIENT_SECRET
     }
-    r = requests.post(SF_TOKEN_URL, data=data)
+    r = SF_SESSION.post(SF_TOKEN_URL, data=data)
     if not r.ok:
         raise Exception(f"Failed to get Salesforce token: {r.text}")
     js = r.json()
+    _SF_TOKEN["access_token"] = js["access_token"]
+    _SF_TOKEN["instance_url"] = js["instance_url"]
+    _SF_TOKEN["expires_at"] = time.time() + int(js.get("expires_in", 7200))
     return js["access_token"], js["instance_url"]
 
-def soql(instance_url, access_token, query):
-    url = f"{instance_url}/services/data/{SF_API_VERSION}/query"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    r = requests.get(url, headers=headers, params={"q": query})
+def _sf_get(url, access_token, **kwargs):
+    """
+    GETs a Salesforce REST resource. On 401 (session expired before the assumed
+    lifetime, or revoked) fetches a fresh token and retries once.
+    """
+    r = SF_SESSION.get(url, headers={"Authorization": f"Bearer {access_token}"}, **kwargs)
+    if r.status_code == 401:
+        if access_token == _SF_TOKEN["access_token"]:
+            _SF_TOKEN["expires_at"] = 0 # Force a refresh; another call may already have done it
+        access_token, _ = get_salesforce_token()
+        r = SF_SESSION.get(url, headers={"Authorization": f"Bearer {access_token}"}, **kwargs)
     if not r.ok:
         raise Exception(f"SOQL error: {r.text}")
-    return r.json()
+    return orjson.loads(r.content)
+
+def soql(instance_url, access_token, query):
+    url = f"{instance_url}/services/data/{SF_API_VERSION}/query"
+    return _sf_get(url, access_token, params={"q": query})
+
+def soql_next(instance_url, access_token, next_records_url):
+    """Fetches the next page of a SOQL result (``nextRecordsUrl``)."""
+    return _sf_get(f"{instance_url}{next_records_url}", access_token)
 
 def get_recent_accounts(token, instance_url):
     """
@@ -70,262 +156,464 @@ def get_recent_accounts(token, instance_url):
     """
     return soql(instance_url, token, query).get("records", [])
 
-def get_account_contacts(token, instance_url, account_id):
-    """
-    ✅ UPDATED: Queries AccountContactRelation to find Direct & Indirect contacts.
-    Checks for Authorized Signatory/Representative in BOTH Position and Role.
-    """
-    query = f"""
-    SELECT ContactId, 
+# Contact query, built once per process; only the AccountId list changes per call
+if USE_AUTH_FORMULA:
+    _AUTH_ROLE_SELECT = f",\n           Contact.{SF_AUTH_ROLE_FIELD}"
+    _AUTH_PREDICATE = f"Contact.{SF_AUTH_CONTACT_FIELD} = true"
+else:
+    _AUTH_ROLE_SELECT = ""
+    _AUTH_PREDICATE = """(
+        Contact.Position__c LIKE '%Authorized Signatory%' 
+        OR Contact.Position__c LIKE '%Authorized Representative%'
+        OR Contact.Contact_Role__c INCLUDES ('Authorized Signatory', 'Authorized Representative')
+    )"""
+
+_CONTACT_QUERY_TMPL = f"""
+    SELECT AccountId,
+           ContactId, 
            Contact.Name, 
            Contact.Email, 
            Contact.Position__c, 
            Contact.Contact_Role__c,
            Contact.Phone, 
-           Contact.MobilePhone
+           Contact.MobilePhone{_AUTH_ROLE_SELECT}
     FROM AccountContactRelation
-    WHERE AccountId = '{account_id}'
+    WHERE AccountId IN ({{ids}})
     AND IsActive = true
-    AND (
-        Contact.Position__c LIKE '%Authorized Signatory%' 
-        OR Contact.Position__c LIKE '%Authorized Representative%'
-        OR Contact.Contact_Role__c INCLUDES ('Authorized Signatory', 'Authorized Representative')
-    )
+    AND {_AUTH_PREDICATE}
+    """
+
+def get_contacts_by_account(token, instance_url, account_ids):
     """
-    
-    data = soql(instance_url, token, query).get("records", [])
-    
-    contacts = []
+    Queries AccountContactRelation to find Direct & Indirect contacts for a chunk
+    of accounts (at most SF_ID_CHUNK_SIZE ids) in one SOQL, grouped by AccountId.
+    Checks for Authorized Signatory/Representative in BOTH Position and Role.
+    """
+    ids = ",".join(f"'{acc_id}'" for acc_id in account_ids)
+    query = _CONTACT_QUERY_TMPL.format(ids=ids)
+
+    js = soql(instance_url, token, query)
+    data = js.get("records", [])
+    while js.get("nextRecordsUrl"):
+        js = soql_next(instance_url, token, js["nextRecordsUrl"])
+        data.extend(js.get("records", []))
+
+    contacts_by_account = {acc_id: [] for acc_id in account_ids}
     for item in data:
         contact_data = item.get("Contact", {})
         contact_data["Id"] = item.get("ContactId")
-        contacts.append(contact_data)
-        
-    return contacts
+        contacts_by_account.setdefault(item.get("AccountId"), []).append(contact_data)
+
+    return contacts_by_account
+
+def get_contact_role(contact):
+    """
+    Returns "Authorized Signatory" / "Authorized Representative" for a contact,
+    or None if it is neither. Signatory wins when both appear.
+    """
+    if USE_AUTH_FORMULA:
+        return contact.get(SF_AUTH_ROLE_FIELD) or None
+
+    position_raw = str(contact.get("Position__c") or "")
+    role_raw = str(contact.get("Contact_Role__c") or "")
+    combined_roles = (position_raw + " " + role_raw).lower()
+
+    if "authorized signatory" in combined_roles:
+        return "Authorized Signatory"
+    if "authorized representative" in combined_roles:
+        return "Authorized Representative"
+    return None
 
 # ===========================
 # JIRA HELPERS
 # ===========================
-def create_org(name):
+def _retry_after(r, default=1.0):
+    """Seconds Jira asks us to wait before retrying (Retry-After), else `default`."""
+    try:
+        return float(r.headers.get("Retry-After", default))
+    except ValueError: # HTTP-date form
+        return default
+
+async def _jira_request(client, method, url, **kwargs):
+    """
+    Sends one Jira request. Every Jira call goes through here so that 429s are
+    waited out (Retry-After) and re-sent up to RATE_LIMIT_RETRIES times, and the
+    calling worker slows down when Jira reports X-RateLimit-NearLimit.
+    """
+    r = await client.request(method, url, **kwargs)
+    for _ in range(RATE_LIMIT_RETRIES):
+        if r.status_code != 429:
+            break
+        await asyncio.sleep(_retry_after(r))
+        r = await client.request(method, url, **kwargs)
+
+    if r.headers.get("X-RateLimit-NearLimit", "").lower() == "true":
+        await asyncio.sleep(NEAR_LIMIT_PAUSE)
+    return r
+
+async def create_org(client, name):
     name = str(name).strip()
     url = f"{JIRA_URL}/rest/servicedeskapi/organization"
-    
+
     # Attempt to create
-    r = requests.post(url, headers=JIRA_HEADERS, auth=AUTH, json={"name": name})
-    
+    r = await _jira_request(client, "POST", url, content=orjson.dumps({"name": name}))
+
     if r.status_code == 201:
-        return r.json().get("id")
+        org_id = r.json().get("id")
+        _ORG_CACHE[_org_key(name)] = org_id
+        return org_id
 
     # If it fails, check if it already exists
     if r.status_code in (400, 409):
-        # print(f"   ℹ️ Org '{name}' might exist. Searching...") # Optional debug log
-        org_id = find_org_id(name)
+        # log.debug("   ℹ️ Org '%s' might exist. Searching...", name) # Optional debug log
+        org_id = await find_org_id(client, name)
         if org_id:
             return org_id
-        
+
         # If search also fails, print the CREATE error to understand why
-        print(f"   ❌ Failed to create '{name}' (Status: {r.status_code})")
-        print(f"      Response: {r.text}") # <--- THIS IS KEY
+        log.warning("   ❌ Failed to create '%s' (Status: %s) Response: %s", name, r.status_code, r.text[:200])
         return None
 
     # For other errors (401, 403, 500)
-    print(f"   ❌ API Error creating '{name}': {r.status_code}")
-    print(f"      Response: {r.text}")
+    log.warning("   ❌ API Error creating '%s': %s Response: %s", name, r.status_code, r.text[:200])
     return None
 
-def find_org_id(name):
+def _org_key(name):
+    """Cache key for an org name; casefolded to match Jira's case-insensitive uniqueness."""
+    return str(name).strip().casefold()
+
+async def _prime_org_cache(client):
+    """Pages through the whole org directory once and indexes it by name."""
     start = 0
-    name = str(name).strip()
+    url = f"{JIRA_URL}/rest/servicedeskapi/organization"
     while True:
-        url = f"{JIRA_URL}/rest/servicedeskapi/organization"
-        r = requests.get(url, headers=JIRA_HEADERS, auth=AUTH,
-                         params={"start": start, "limit": 50})
+        r = await _jira_request(client, "GET", url, params={"start": start, "limit": 50})
+        if not r.is_success:
+            # Keep whatever was indexed; lookups fall back to a refresh on miss
+            log.warning("   ⚠️ Org directory page %s failed: %s %s", start, r.status_code, r.text[:200])
+            return
         data = r.json()
         for org in data.get("values", []):
-            if org["name"] == name:
-                return org["id"]
+            _ORG_CACHE[_org_key(org["name"])] = org["id"]
         if data.get("isLastPage", True):
             break
         start = data["start"] + data["limit"]
-    return None
 
-def link_org_to_service_desks(org_id):
-    """Links Org to MOBILE, ERT, and SNDBX."""
-    for key in SERVICE_DESK_KEYS:
-        url = f"{JIRA_URL}/rest/servicedeskapi/servicedesk/{key}/organization"
-        r = requests.post(url, headers=JIRA_HEADERS, auth=AUTH, json={"organizationId": org_id})
+async def find_org_id(client, name):
+    key = _org_key(name)
+    org_id = _ORG_CACHE.get(key)
+    if org_id is None:
+        # Cache not primed yet, or org created since (e.g. by another run) - refresh once
+        await _prime_org_cache(client)
+        org_id = _ORG_CACHE.get(key)
+    return org_id
+
+async def link_org_to_service_desks(client, org_id):
+    """
+    Links Org to MOBILE, ERT, and SNDBX (all three requests in flight at once).
+    Returns False if any desk failed to link.
+    """
+    body = orjson.dumps({"organizationId": org_id}) # Same body for every desk
+    responses = await asyncio.gather(*(
+        _jira_request(client, "POST", f"{JIRA_URL}/rest/servicedeskapi/servicedesk/{key}/organization",
+                      content=body)
+        for key in SERVICE_DESK_KEYS
+    ))
+    linked = True
+    for key, r in zip(SERVICE_DESK_KEYS, responses):
         if r.status_code not in (204, 404):
-             print(f"   ⚠️ Failed linking to '{key}': {r.status_code}")
+             log.warning("   ⚠️ Failed linking to '%s': %s", key, r.status_code)
+             linked = False
+    return linked
+
+async def search_jira_user(client, email):
+    key = email.strip().lower()
+    if key in _USER_CACHE:
+        return _USER_CACHE[key]
 
-def search_jira_user(email):
     url = f"{JIRA_URL}/rest/api/3/user/search"
-    r = requests.get(url, headers=JIRA_HEADERS, auth=AUTH, params={"query": email})
-    if not r.ok: return None
+    r = await _jira_request(client, "GET", url, params={"query": email})
+    if not r.is_success: return None
     users = r.json()
     for u in users:
-        if u.get("emailAddress", "").lower() == email.lower():
-            return u.get("accountId")
+        if u.get("emailAddress", "").lower() == key:
+            account_id = u.get("accountId")
+            if account_id:
+                _USER_CACHE[key] = account_id
+            return account_id
     return None
 
-def create_jira_customer(name, email):
+def _forget_customer(email):
+    """Drops a cached accountId, e.g. after the customer was deleted in Jira."""
+    _USER_CACHE.pop(email.strip().lower(), None)
+
+async def create_jira_customer(client, name, email):
+    key = email.strip().lower()
+    if key in _USER_CACHE:
+        return _USER_CACHE[key]
+
     url = f"{JIRA_URL}/rest/servicedeskapi/customer"
-    r = requests.post(url, headers=JIRA_HEADERS, auth=AUTH,
-                      json={"fullName": name, "email": email})
+    r = await _jira_request(client, "POST", url, content=orjson.dumps({"fullName": name, "email": email}))
     if r.status_code == 201:
-        return r.json().get("accountId")
+        account_id = r.json().get("accountId")
+        if account_id:
+            _USER_CACHE[key] = account_id
+        return account_id
     if r.status_code in (400, 409):
-        return search_jira_user(email)
+        return await search_jira_user(client, email)
     return None
 
-def add_users_to_org(org_id, ids):
-    if not ids: return
+async def add_users_to_org(client, org_id, ids):
+    if not ids: return True
     url = f"{JIRA_URL}/rest/servicedeskapi/organization/{org_id}/user"
-    requests.post(url, headers=JIRA_HEADERS, auth=AUTH, json={"accountIds": ids})
+    r = await _jira_request(client, "POST", url, content=orjson.dumps({"accountIds": ids}))
+    return r.is_success
 
 # ===========================
 # ROBUST UPDATE FUNCTIONS
 # ===========================
-def update_org_detail_field(org_id, field_name, value, org_name):
-    if not value: return False
-
-    url = f"https://api.atlassian.com/jsm/csm/cloudid/{JIRA_CLOUD_ID}/api/v1/organization/{org_id}/details"
+async def _put_detail(client, url, field_name, value, label, max_retries=3):
+    """
+    PUTs a single CSM details field, retrying on indexing lag (404) with
+    exponential backoff (rate limits are handled by _jira_request).
+    No delay before the first attempt.
+    Returns the last response, or None if every attempt raised.
+    """
     query = {'fieldName': field_name}
-    payload = json.dumps({"values": [str(value)]})
-    
-    time.sleep(1) # Buffer for indexing
-    
-    for attempt in range(1, 4): # Retry 3 times
+    payload = orjson.dumps({"values": [str(value)]})
+    r = None
+
+    for attempt in range(1, max_retries + 1):
         try:
-            r = requests.put(url, data=payload, headers=JIRA_HEADERS, params=query, auth=AUTH)
-            if r.status_code == 200:
-                print(f"   ✅ [ORG UPDATE] Success: {field_name} for '{org_name}'")
-                return True
-            if r.status_code == 404: 
-                time.sleep(attempt * 1.5)
-            elif r.status_code == 429: 
-                time.sleep(5)
-            else: 
-                break
+            r = await _jira_request(client, "PUT", url, content=payload, params=query)
+            if r.status_code != 404:
+                return r
+            if attempt < max_retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
         except Exception as e:
-            print(f"   ❌ [ORG: {org_name}] Error updating Field '{field_name}': {e}")
-            time.sleep(1)
-            
-    print(f"   ⚠️ [ORG: {org_name}] Failed to update: {field_name}")
+            log.warning("   ❌ [%s] Error updating Field '%s': %s", label, field_name, e)
+            if attempt < max_retries:
+                await asyncio.sleep(1)
+    return r
+
+async def get_org_detail_field(client, org_id, field_name):
+    """Returns the first value of an org details field, or None if unset/unreadable."""
+    url = f"https://api.atlassian.com/jsm/csm/cloudid/{JIRA_CLOUD_ID}/api/v1/organization/{org_id}/details"
+    r = await _jira_request(client, "GET", url, params={'fieldName': field_name})
+    if not r.is_success: return None
+    values = r.json().get("values") or []
+    return values[0] if values else None
+
+async def update_org_detail_field(client, org_id, field_name, value, org_name):
+    if not value: return False
+
+    url = f"https://api.atlassian.com/jsm/csm/cloudid/{JIRA_CLOUD_ID}/api/v1/organization/{org_id}/details"
+
+    r = await _put_detail(client, url, field_name, value, f"ORG: {org_name}", max_retries=3)
+    if r is not None and r.status_code == 200:
+        log.info("   ✅ [ORG UPDATE] Success: %s for '%s'", field_name, org_name)
+        return True
+
+    log.warning("   ⚠️ [ORG: %s] Failed to update: %s", org_name, field_name)
     return False
 
-def update_customer_detail_field(account_id, field_name, value, customer_email):
+async def update_customer_detail_field(client, account_id, field_name, value, customer_email):
     if not value: return False
 
     url = f"https://api.atlassian.com/jsm/csm/cloudid/{JIRA_CLOUD_ID}/api/v1/customer/{account_id}/details"
-    query = {'fieldName': field_name}
-    payload = json.dumps({"values": [str(value)]})
-    
-    time.sleep(0.5) # Buffer for indexing
-    
-    max_retries = 5
-    for attempt in range(1, max_retries + 1):
-        try:
-            r = requests.put(url, data=payload, headers=JIRA_HEADERS, params=query, auth=AUTH)
-            if r.status_code == 200: 
-                print(f"   ✅ [CUSTOMER UPDATE] Success: {field_name} for {customer_email}")
-                return True
-            elif r.status_code == 404: time.sleep(attempt * 2)
-            elif r.status_code == 429: time.sleep(5)
-            else: 
-                print(f"   ⚠️ [USER: {customer_email}] Failed {field_name}: {r.status_code} {r.text}")
-                break
-        except Exception as e:
-            print(f"   ❌ [USER: {customer_email}] Error updating Field '{field_name}': {e}")
-            time.sleep(1)
-            
-    print(f"   ⚠️ [USER: {customer_email}] Failed update: {field_name}")
+
+    r = await _put_detail(client, url, field_name, value, f"USER: {customer_email}", max_retries=5)
+    if r is not None and r.status_code == 200:
+        log.info("   ✅ [CUSTOMER UPDATE] Success: %s for %s", field_name, customer_email)
+        return True
+    if r is not None and r.status_code not in (404, 429):
+        log.warning("   ⚠️ [USER: %s] Failed %s: %s %s", customer_email, field_name, r.status_code, r.text[:200])
+
+    log.warning("   ⚠️ [USER: %s] Failed update: %s", customer_email, field_name)
     return False
 
+async def bulk_update_org_details(client, org_id, fields, org_name):
+    """
+    Applies a {field_name: value} dict to one org. The CSM details API takes one
+    field per request, so the PUTs are issued together.
+    """
+    return await asyncio.gather(*(
+        update_org_detail_field(client, org_id, field_name, value, org_name)
+        for field_name, value in fields.items()
+    ))
+
+async def bulk_update_customer_details(client, account_id, fields, customer_email):
+    """Same as bulk_update_org_details, for a customer's details."""
+    return await asyncio.gather(*(
+        update_customer_detail_field(client, account_id, field_name, value, customer_email)
+        for field_name, value in fields.items()
+    ))
+
 # ===========================
 # PROCESS LOGIC
 # ===========================
-def process_single_account(acc, sf_token, sf_instance):
+def _sync_hash(org_fields, customers):
+    """Stable digest of everything the sync writes for one account."""
+    content = {
+        "org": org_fields,
+        "customers": sorted(customers, key=lambda c: c["Email Address"]),
+        # A newly added desk must invalidate the hash so existing orgs get linked
+        "service_desks": SERVICE_DESK_KEYS,
+    }
+    return hashlib.blake2b(orjson.dumps(content, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+async def process_single_account(client, acc, contacts, customer_sem):
     try:
         acc_id = acc["Id"]
         acc_name = acc["Name"]
-        print(f"➡️ Processing {acc_name} ({acc_id})")
-
-        # 1. Org Logic
-        org_id = create_org(acc_name)
-        if not org_id:
-            print("❌ Could not create/fetch org")
-            return
-        
-        link_org_to_service_desks(org_id)
-
-        # 2. Org Details
-        update_org_detail_field(org_id, "Salesforce Account Id", acc_id)
-        update_org_detail_field(org_id, "Company Name", acc_name)
-        update_org_detail_field(org_id, "Company Address", acc.get("B2B_Full_Address_2__c"))
-        update_org_detail_field(org_id, "Industry", acc.get("Industry"))
-        update_org_detail_field(org_id, "Customer Type", "Customer")
-        
-        owner = acc.get("Owner")
-        if owner and owner.get("Name"):
-            update_org_detail_field(org_id, "Account Manager", owner.get("Name"))
-
-        update_org_detail_field(org_id, "Sales Cluster", acc.get("B2B_Cluster__c"))
-        update_org_detail_field(org_id, "Sales Area", acc.get("B2B_Area__c"))
-
-        # 3. Contact Logic
-        contacts = get_account_contacts(sf_token, sf_instance, acc_id)
-        account_ids = []
-
+        log.info("➡️ Processing %s (%s)", acc_name, acc_id)
+
+        # 1. Org Details
+        owner = acc.get("Owner") or {}
+        org_fields = {
+            "Salesforce Account Id": acc_id,
+            "Company Name": acc_name,
+            "Company Address": acc.get("B2B_Full_Address_2__c"),
+            "Industry": acc.get("Industry"),
+            "Customer Type": "Customer",
+            "Account Manager": owner.get("Name"),
+            "Sales Cluster": acc.get("B2B_Cluster__c"),
+            "Sales Area": acc.get("B2B_Area__c"),
+        }
+        # Only send fields that actually carry a value
+        org_fields = {k: v for k, v in org_fields.items() if v not in (None, "", " ")}
+
+        # 2. Customer Details
+        customers = []
         for c in contacts:
             email = str(c.get("Email") or "").strip()
             name = str(c.get("Name") or "").strip()
             phone = str(c.get("MobilePhone") or c.get("Phone") or "").strip()
-            
-            position_raw = str(c.get("Position__c") or "")
-            role_raw = str(c.get("Contact_Role__c") or "")
-            combined_roles = (position_raw + " " + role_raw).lower()
 
             if not email: continue
 
-            # Priority Logic
-            final_role = None
-            if "authorized signatory" in combined_roles:
-                final_role = "Authorized Signatory"
-            elif "authorized representative" in combined_roles:
-                final_role = "Authorized Representative"
-            else:
-                continue
+            final_role = get_contact_role(c)
+            if not final_role: continue
+
+            # Strict Field Updates
+            customer_fields = {
+                "ROLE": final_role,
+                "Mobile Number": phone,
+                "Full Name": name,
+                "Email Address": email,
+            }
+            customers.append({k: v for k, v in customer_fields.items() if v not in (None, "", " ")})
 
-            acct_id = create_jira_customer(name, email)
+        content_hash = _sync_hash(org_fields, customers)
+
+        # 3. Org Logic
+        org_id = await create_org(client, acc_name)
+        if not org_id:
+            log.warning("❌ Could not create/fetch org for %s", acc_name)
+            return
+
+        if SYNC_HASH_FIELD and await get_org_detail_field(client, org_id, SYNC_HASH_FIELD) == content_hash:
+            log.info("⏭️ %s unchanged since last sync, skipping", acc_name)
+            return
 
+        results = [await link_org_to_service_desks(client, org_id)]
+        results.extend(await bulk_update_org_details(client, org_id, org_fields, acc_name))
+
+        # 4. Contact Logic (only for accounts that actually need syncing)
+        async def sync_customer(customer_fields):
+            email = customer_fields["Email Address"]
+            async with customer_sem: # Shared by every worker in the run
+                acct_id = await create_jira_customer(client, customer_fields.get("Full Name", ""), email)
+                if not acct_id:
+                    return None, [False]
+                customer_results = await bulk_update_customer_details(client, acct_id, customer_fields, email)
+            if not all(customer_results):
+                _forget_customer(email) # Cached accountId may be stale; re-resolve next run
+            return acct_id, customer_results
+
+        account_ids = []
+        for acct_id, customer_results in await asyncio.gather(*(sync_customer(f) for f in customers)):
             if acct_id:
                 account_ids.append(acct_id)
-                # Strict Field Updates
-                update_customer_detail_field(acct_id, "ROLE", final_role)
-                update_customer_detail_field(acct_id, "Mobile Number", phone)
-                update_customer_detail_field(acct_id, "Full Name", name)
-                update_customer_detail_field(acct_id, "Email Address", email)
+            results.extend(customer_results)
+
+        # 5. Add users to Org
+        added = await add_users_to_org(client, org_id, account_ids)
+        if not added:
+            for customer_fields in customers:
+                _forget_customer(customer_fields["Email Address"])
+        results.append(added)
 
-        # 4. Add users to Org
-        add_users_to_org(org_id, account_ids)
+        # 6. Record the hash only once everything landed, so partial failures are retried next run
+        if SYNC_HASH_FIELD and all(results):
+            await update_org_detail_field(client, org_id, SYNC_HASH_FIELD, content_hash, acc_name)
 
     except Exception as e:
-        print(f"❌ Error processing {acc.get('Name')}: {e}")
+        log.error("❌ Error processing %s: %s", acc.get('Name'), e)
 
 # ===========================
 # LAMBDA HANDLER
 # ===========================
+async def _amain(event):
+    if JIRA_CONCURRENCY < 1:
+        # Zero workers would leave the producer blocked on a full queue forever
+        raise ValueError(f"JIRA_CONCURRENCY must be >= 1, got {JIRA_CONCURRENCY}")
+
+    token, instance = get_salesforce_token()
+    accounts = get_recent_accounts(token, instance)
+    log.info("Processing %d updated accounts today.", len(accounts))
+    if not accounts:
+        return {"status": "ok", "accounts_processed": 0}
+
+    # One HTTP/2 client shared by every Jira call in this run
+    limits = httpx.Limits(max_connections=JIRA_MAX_CONNECTIONS,
+                          max_keepalive_connections=JIRA_MAX_CONNECTIONS)
+    queue = asyncio.Queue(maxsize=ACCOUNT_QUEUE_SIZE)
+    customer_sem = asyncio.Semaphore(JIRA_CONCURRENCY)
+
+    async with httpx.AsyncClient(auth=AUTH, headers=JIRA_HEADERS, http2=True,
+                                 timeout=30.0, limits=limits) as client:
+        _ORG_CACHE.clear()
+        # Page the org directory while the first contact SOQL is in flight
+        prime_task = asyncio.create_task(_prime_org_cache(client))
+
+        async def fetch_contacts():
+            """Producer: one contact SOQL per chunk of accounts, queued per account."""
+            try:
+                for i in range(0, len(accounts), SF_ID_CHUNK_SIZE):
+                    chunk = accounts[i:i + SF_ID_CHUNK_SIZE]
+                    contacts_by_account = await asyncio.to_thread(
+                        get_contacts_by_account, token, instance, [a["Id"] for a in chunk])
+                    for acc in chunk:
+                        await queue.put((acc, contacts_by_account.get(acc["Id"], [])))
+            finally:
+                for _ in range(JIRA_CONCURRENCY):
+                    await queue.put(None) # One stop marker per worker
+
+        async def process_accounts():
+            """Consumer: syncs queued accounts to Jira until it reads a stop marker."""
+            await asyncio.wait([prime_task]) # A failed prime only means refresh-on-miss lookups
+            while (item := await queue.get()) is not None:
+                await process_single_account(client, *item, customer_sem)
+
+        # Workers never raise (process_single_account logs its own errors); the
+        # producer's Salesforce errors are re-raised once every worker has drained.
+        results = await asyncio.gather(
+            fetch_contacts(),
+            *(process_accounts() for _ in range(JIRA_CONCURRENCY)),
+            return_exceptions=True,
+        )
+        if not prime_task.cancelled() and prime_task.exception():
+            log.warning("   ⚠️ Org directory prime failed: %s", prime_task.exception())
+        if isinstance(results[0], BaseException):
+            raise results[0]
+
+    return {"status": "ok", "accounts_processed": len(accounts)}
+
 def lambda_handler(event, context):
     try:
-        token, instance = get_salesforce_token()
-        accounts = get_recent_accounts(token, instance)
-        print(f"Processing {len(accounts)} updated accounts today.")
-
-        for acc in accounts:
-            process_single_account(acc, token, instance)
-
-        return {"status": "ok", "accounts_processed": len(accounts)}
+        return asyncio.run(_amain(event))
 
     except Exception as e:
-        print(f"❌ Critical Error: {str(e)}")
+        log.error("❌ Critical Error: %s", e)
         return {"status": "error", "message": str(e)}